@@ -1,4 +1,4 @@
-"""Module for turning a combined imagej output file into a dataset.
+"""Module for turning a combined imagej output file, or the bat box photos themselves, into a dataset.
 By Hugo Loning 2016
 """
 
@@ -6,8 +6,8 @@ import re
 import time
 
 from helper.combine_output_files import combine_imagej_files
-from helper.load_info import load_transects
-from helper.write_data import write_array
+from helper.reference_data import load_transects
+from helper.write_data import write_array, write_sqlite
 
 
 def extract_info(filename):
@@ -29,11 +29,35 @@ def load_imagej_array():
     return ij_array
 
 
-def create_imagej_dataset():
+def extract_image_info(filename):
+    """Return a list with transect, box, year, month and day of a bat box photo filename"""
+    match = re.search(r'tr(\d+)_k(\d+)_(\d{4})(\d{2})(\d{2})_\d+_IMG_\d+', filename)
+    return [int(elem) for elem in match.groups()]
+
+
+def load_image_array(directory, threshold=None, min_size=0, workers=None):
+    """Return an array representation like load_imagej_array, but measured directly from the bat box photos
+    in directory instead of from imagej output files.
+    """
+    from helper.image_analysis import analyse_images  # needs numpy, scipy and pillow, only import when measuring
+
+    ij_array = []
+    for filename, oval_area, particle_areas in analyse_images(directory, threshold, min_size, workers):
+        transect, box, year, month, day = extract_image_info(filename)
+        if box == 75 or box == 78:  # box 75 and 78 are actually 45 and 48
+            box -= 30
+        ij_array.append([transect, box, year, month, day, oval_area, "oval"])
+        for area in particle_areas:
+            ij_array.append([transect, box, year, month, day, area, "particles"])
+    return ij_array
+
+
+def create_imagej_dataset(ij_array=None):
     """Return a complete dataset array with total area and area of particles (poo)
-    for each bat box measurement in imagej output files.
+    for each bat box measurement in imagej output files, or in supplied ij_array.
     """
-    ij_array = load_imagej_array()
+    if ij_array is None:
+        ij_array = load_imagej_array()
 
     # get an entry for each measurement, with a 0 for counting all the poo particles' pixels
     ij_dataset = [row[:-1] + [0] for row in ij_array if row[6] == "oval"]
@@ -60,17 +84,26 @@ def create_imagej_dataset():
 
 # The script is here
 if __name__ == "__main__":
-    # Specify output file
+    # Specify output file and whether to measure the photos directly instead of using imagej output files
     file_to_write = 'dataset_imagej.csv'
+    database = None  # set to a file name like 'lon_datasets.sqlite' to also store the dataset in an sqlite database
+    measure_images = False
+    image_directory = 'bat_box_images'
 
     # The script
     print("IMAGEJ OUTPUT DATA CREATION SCRIPT FOR LON BY HUGO LONING 2016\n")
-    print("Creating imagej dataset from output files...\n")
     start_time1 = time.time()  # measure time to complete program
-    loaded, header_names = create_imagej_dataset()
+    if measure_images:
+        print("Measuring bat box photos in {}...\n".format(image_directory))
+        loaded, header_names = create_imagej_dataset(load_image_array(image_directory))
+    else:
+        print("Creating imagej dataset from output files...\n")
+        loaded, header_names = create_imagej_dataset()
     print("Loaded in {:.3f} seconds\n".format(time.time() - start_time1))
     print("Writing imagej dataset to {}...\n".format(file_to_write))
     start_time2 = time.time()
     write_array(loaded, header_names, file_to_write)
+    if database is not None:
+        write_sqlite(loaded, header_names, database, "imagej")
     print("Written in {:.3f} seconds, total run time {:.3f} seconds.".format(time.time() - start_time2,
                                                                              time.time() - start_time1))
@@ -2,14 +2,15 @@
 Be sure to use python3 when running this code. By Hugo Loning 2016
 """
 
-from helper.load_info import load_transects
-from helper.write_data import write_array
+from concurrent.futures import ThreadPoolExecutor
 
+from helper.reference_data import load_transects
+from helper.write_data import write_array, write_sqlite
 
-def load_bats_in_boxes_file(filename):
-    """Return bats dataset array of specified file including transect information"""
+
+def iter_bats_in_boxes_file(filename):
+    """Yield the rows of the bats dataset of specified file including transect information one by one"""
     tr_array = load_transects()
-    bats_array = []
     with open(filename) as bats_file:
         for line in bats_file:
             if line.startswith("transect;box"):  # if it's the header
@@ -32,25 +33,35 @@ def load_bats_in_boxes_file(filename):
             site, colour = tr_array[transect]
             line.insert(0, site)
             line.insert(3, colour)
-            bats_array.append(line)
-    return bats_array  # [site, transect, box, colour, day, month, year, poo, animals, species, sex, ual, mass, remarks]
+            # [site, transect, box, colour, day, month, year, poo, animals, species, sex, ual, mass, remarks]
+            yield line
+
+
+def load_bats_in_boxes_file(filename):
+    """Return bats dataset array of specified file including transect information"""
+    return list(iter_bats_in_boxes_file(filename))
+
+
+def update_data_dict(data_dict, row):
+    """Count and score poo (yes/no) for Pp and bats of a single row of a bats array in data_dict"""
+    site, transect, box, colour = row[:4]
+    poo, nr, species = row[7:10]
+    remark = row[-1]
+    if transect not in data_dict:  # add it
+        data_dict[transect] = [site, transect, colour, 0, 0, 0, 0]  # [site, tr, clr, pp_poo, bat_poo, pp, bats]
+    data_dict[transect][4] = data_dict[transect][4] or poo  # update bat_poo
+    if not remark.startswith('poo'):  # all remarks starting with poo indicate that the poo is not of Pp
+        data_dict[transect][3] = data_dict[transect][3] or poo  # update pp_poo
+    data_dict[transect][6] += nr  # update number of bats
+    if species == 'pp':
+        data_dict[transect][5] += nr  # update number of Pippistrellus pippistrellus
 
 
 def create_data_dict(bats_array):
     """Return a dictionary of specified bats array which counts and scores poo (yes/no) for Pp and bats"""
     data_dict = {}
     for row in bats_array:
-        site, transect, box, colour = row[:4]
-        poo, nr, species = row[7:10]
-        remark = row[-1]
-        if transect not in data_dict:  # add it
-            data_dict[transect] = [site, transect, colour, 0, 0, 0, 0]  # [site, tr, clr, pp_poo, bat_poo, pp, bats]
-        data_dict[transect][4] = data_dict[transect][4] or poo  # update bat_poo
-        if not remark.startswith('poo'):  # all remarks starting with poo indicate that the poo is not of Pp
-            data_dict[transect][3] = data_dict[transect][3] or poo  # update pp_poo
-        data_dict[transect][6] += nr  # update number of bats
-        if species == 'pp':
-            data_dict[transect][5] += nr  # update number of Pippistrellus pippistrellus
+        update_data_dict(data_dict, row)
     return data_dict
 
 
@@ -59,6 +70,11 @@ def create_data_array(bats_array):
     also return the header names of this dataset array
     """
     data_dict = create_data_dict(bats_array)
+    return data_array_from_dict(data_dict)
+
+
+def data_array_from_dict(data_dict):
+    """Return the dataset array of create_data_array from a filled data_dict, also return the header names"""
     data_array = []
     for tr in data_dict:
         data_array.append(data_dict[tr])
@@ -66,36 +82,62 @@ def create_data_array(bats_array):
     return data_array, col_names
 
 
+def body_measurement_row(row):
+    """Return the body measurement row with body condition index of a single row of a bats array,
+    or None if the bat was not measured.
+    """
+    sex, ual, mass = row[10:13]
+    if sex == '':  # if it's not a measured bat
+        return None
+    bci_row = row[:-1]  # copy everything but the remark
+    try:
+        bci_row.append(mass / ual)
+    except TypeError:
+        bci_row.append('NA')
+    del bci_row[7:9]  # remove information of poo and number of animals (always 1)
+    return bci_row
+
+
 def create_body_measurement_array(bats_array):
     """Return a dataset array with body measurements and body condition index for all bats,
     also return the header names of this dataset array
     """
     meas_array = []
     for row in bats_array:
-        sex, ual, mass = row[10:13]
-        if sex != '':  # if it's a measured bat
-            bci_row = row[:-1]  # copy everything but the remark
-            try:
-                bci_row.append(mass / ual)
-            except TypeError:
-                bci_row.append('NA')
-            del bci_row[7:9]  # remove information of poo and number of animals (always 1)
+        bci_row = body_measurement_row(row)
+        if bci_row is not None:  # if it's a measured bat
             meas_array.append(bci_row)
-    col_names = ['site', 'transect', 'box', 'colour', 'day', 'month', 'year', 'species', 'sex', 'ual', 'mass', 'bci']
-    return meas_array, col_names
+    return meas_array, body_measurement_column_names()
+
+
+def body_measurement_column_names():
+    """Return the header names of the body measurement dataset array"""
+    return ['site', 'transect', 'box', 'colour', 'day', 'month', 'year', 'species', 'sex', 'ual', 'mass', 'bci']
 
 
 def create_sex_counted_array(bats_array):
     """Return a dataset array with counted bats of which sex is known, also return header names"""
     sex_counted_dict = {}
     for row in bats_array:
-        site, transect, box, colour, *rest, species, sex = row[:11]
-        if transect not in sex_counted_dict:
-            sex_counted_dict[transect] = [transect, site, colour, 0, 0]
-        if sex == 'male' and species == 'pp':  # count males
-            sex_counted_dict[transect][3] += 1
-        elif sex == 'female' and species == 'pp':  # count females
-            sex_counted_dict[transect][4] += 1
+        update_sex_counted_dict(sex_counted_dict, row)
+    return sex_counted_array_from_dict(sex_counted_dict)
+
+
+def update_sex_counted_dict(sex_counted_dict, row):
+    """Count the Pp males and females of a single row of a bats array in sex_counted_dict"""
+    site, transect, box, colour, *rest, species, sex = row[:11]
+    if transect not in sex_counted_dict:
+        sex_counted_dict[transect] = [transect, site, colour, 0, 0]
+    if sex == 'male' and species == 'pp':  # count males
+        sex_counted_dict[transect][3] += 1
+    elif sex == 'female' and species == 'pp':  # count females
+        sex_counted_dict[transect][4] += 1
+
+
+def sex_counted_array_from_dict(sex_counted_dict):
+    """Return the dataset array of create_sex_counted_array from a filled sex_counted_dict, also return
+    header names
+    """
     sex_counted_array = []
     for value in sex_counted_dict.values():
         transect, site, colour, male, female = value
@@ -105,6 +147,36 @@ def create_sex_counted_array(bats_array):
     return sex_counted_array, col_names
 
 
+def create_all_arrays(bats_rows):
+    """Return the results of create_data_array, create_body_measurement_array and create_sex_counted_array
+    in a tuple of length 3, computed in a single pass over iterable bats_rows (for example streamed from
+    iter_bats_in_boxes_file).
+    """
+    data_dict, meas_array, sex_counted_dict = {}, [], {}
+    for row in bats_rows:
+        update_data_dict(data_dict, row)
+        bci_row = body_measurement_row(row)
+        if bci_row is not None:  # if it's a measured bat
+            meas_array.append(bci_row)
+        update_sex_counted_dict(sex_counted_dict, row)
+    return (data_array_from_dict(data_dict), (meas_array, body_measurement_column_names()),
+            sex_counted_array_from_dict(sex_counted_dict))
+
+
+def write_all_arrays(bats_rows, output_files):
+    """Create the three datasets of iterable bats_rows in a single pass with create_all_arrays and write them
+    at the same time to the three files in output_files (bats, body measurements, sex counted).
+    Return the three datasets like create_all_arrays.
+    """
+    all_arrays = create_all_arrays(bats_rows)
+    with ThreadPoolExecutor(max_workers=len(output_files)) as executor:
+        writes = [executor.submit(write_array, array, header, output_file)
+                  for (array, header), output_file in zip(all_arrays, output_files)]
+        for write in writes:
+            write.result()  # raise errors of the writing threads here
+    return all_arrays
+
+
 # Script begins here
 if __name__ == "__main__":
     # Specify file to load and files to write
@@ -112,17 +184,15 @@ if __name__ == "__main__":
     write_bats = 'dataset_bats_in_bat_boxes.csv'
     write_body_measurements = 'dataset_bat_body_measurements.csv'
     write_sex_counted = 'dataset_bats_sex_counted.csv'
+    database = None  # set to a file name like 'lon_datasets.sqlite' to also store the datasets in an sqlite database
 
     # The script
     print("BATS IN BAT BOXES DATA CREATION SCRIPT FOR LON BY HUGO LONING 2016\n")
-    loaded = load_bats_in_boxes_file(to_load)
-    print("Loaded {}...\n".format(to_load))
-    array, header_names = create_data_array(loaded)
-    write_array(array, header_names, write_bats)
-    print("Written bats dataset to {}\n".format(write_bats))
-    measurement_array, headers = create_body_measurement_array(loaded)
-    write_array(measurement_array, headers, write_body_measurements)
-    print("Written body measurements dataset to {}\n".format(write_body_measurements))
-    sex_counted, columns = create_sex_counted_array(loaded)
-    write_array(sex_counted, columns, write_sex_counted)
-    print("Written sex counted bats dataset to " + write_sex_counted)
+    output_files = [write_bats, write_body_measurements, write_sex_counted]
+    datasets = write_all_arrays(iter_bats_in_boxes_file(to_load), output_files)
+    print("Loaded {} and written bats dataset to {}, body measurements dataset to {}\n"
+          "and sex counted bats dataset to {}".format(to_load, write_bats, write_body_measurements,
+                                                      write_sex_counted))
+    if database is not None:
+        for (array, header), table in zip(datasets, ["bats_in_bat_boxes", "bat_body_measurements", "bats_sex_counted"]):
+            write_sqlite(array, header, database, table)
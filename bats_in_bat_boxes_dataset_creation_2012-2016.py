@@ -2,8 +2,8 @@
 Be sure to use python3 when running this code. By Hugo Loning 2016
 """
 
-from helper.load_info import load_transects
-from helper.write_data import write_array
+from helper.reference_data import load_transects
+from helper.write_data import write_array, write_sqlite
 
 
 def load_bats_in_boxes_file(filename):
@@ -89,6 +89,7 @@ if __name__ == "__main__":
     to_load = 'all_bat_box_checks_2012_to_2016.csv'
     write_bats = 'dataset_bat_box_checks_2012_to_2016.csv'
     write_sex_counted = 'dataset_sex_counted_bats_2016.csv'
+    database = None  # set to a file name like 'lon_datasets.sqlite' to also store the datasets in an sqlite database
 
     # The script
     print("BATS IN BAT BOXES DATA CREATION SCRIPT FOR LON BY HUGO LONING 2016\n")
@@ -96,7 +97,11 @@ if __name__ == "__main__":
     print("Loaded {}...\n".format(to_load))
     array, header_names = create_all_year_data(loaded)
     write_array(array, header_names, write_bats)
+    if database is not None:
+        write_sqlite(array, header_names, database, "bat_box_checks_2012_to_2016")
     print("Written bats dataset to {}\n".format(write_bats))
     sc_array, sc_header = create_sex_counted_array(loaded)
     write_array(sc_array, sc_header, write_sex_counted)
+    if database is not None:
+        write_sqlite(sc_array, sc_header, database, "sex_counted_bats_2016")
     print("Written sex counted dataset to {}".format(write_sex_counted))
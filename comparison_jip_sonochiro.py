@@ -2,30 +2,92 @@
 By Hugo Loning 2016
 """
 
+import os
 import time
 from collections import defaultdict
+from operator import itemgetter
 
-from helper.load_info import load_sun_data, lookup_sun_data
+from helper.archive_reader import find_csv_sources, iter_source_lines
+from helper.external_sort import external_sort
+from helper.load_info import lookup_sun_data
+from helper.mmap_reader import iter_fields, split_fields, to_str, to_value
+from helper.reference_data import load_sun_data
 from helper.time_conversion import convert_to_sec
-from helper.write_data import write_array
+from helper.write_data import write_array, write_sqlite
+from sonochiro_dataset_creation import load_sonochiro_file
 
 
 # The functions
 
 
+def iter_array_from_input(jip_sc_file):
+    """Yield the rows of the dataset of input file one by one"""
+    for linecounter, fields in iter_fields(jip_sc_file, delimiter=b';'):
+        if fields[0] == b"File":  # if it's the header
+            continue
+        line = [to_value(elem) for elem in fields]  # convert to int if possible
+        year, month, day, hour, minute, second = line[2:8]
+        line[2:8] = [convert_to_sec(year, month, day, hour, minute, second)]  # replace ymdhms by total in sec's
+        yield line
+
+
 def array_from_input(jip_sc_file):
     """Create dataset from input file, return list"""
-    array = []
-    with open(jip_sc_file) as input_file:
-        for line in input_file:
-            if line.startswith("File;"):  # if it's the header
+    return list(iter_array_from_input(jip_sc_file))
+
+
+def recording_key(filename):
+    """Return the name of a recording without directory and extension, used to match manual scores to sonochiro"""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def create_sonochiro_index(**filters):
+    """Return a dict with recording_key as key and a list [filename, transect, total_time_sec, night, i_buzz]
+    as value of all sonochiro entries, loaded by load_sonochiro_file with supplied filters.
+    """
+    columns = ['filename', 'transect', 'total_time_sec', 'night', 'i_buzz']
+    sonochiro_array = load_sonochiro_file(columns=columns, **filters)[0]
+    return {recording_key(row[0]): row for row in sonochiro_array}
+
+
+def iter_joined_rows(sonochiro_index, scoring_directory, unmatched_manual, repeated_manual, matched_keys):
+    """Yield a row like those of array_from_input for every manual score in the scoring files (filename;buzz)
+    in scoring_directory that has an entry in sonochiro_index. Scores without an entry are added as
+    (scoring file, line, filename) to list unmatched_manual, later scores of a recording that was already scored
+    are added in the same way to list repeated_manual instead of being joined again, keys that were matched are
+    added to set matched_keys.
+    """
+    for scoring_file, path, member in find_csv_sources(scoring_directory):
+        for linecounter, line in enumerate(iter_source_lines(path, member)):
+            fields = split_fields(line, [0, 1], delimiter=b';')
+            if fields[0] == b"File" or not line:  # if it's the header or an empty line
+                continue
+            filename = to_str(fields[0])
+            key = recording_key(filename)
+            if key not in sonochiro_index:
+                unmatched_manual.append(', '.join([scoring_file, str(linecounter), filename]))
                 continue
-            line = line.strip().split(";")
-            line = [int(elem) if elem.isdigit() else elem for elem in line]  # convert to int if possible
-            year, month, day, hour, minute, second = line[2:8]
-            line[2:8] = [convert_to_sec(year, month, day, hour, minute, second)]  # replace ymdhms by total in sec's
-            array += [line]
-    return array
+            if key in matched_keys:  # scored before, joining it again would count the recording twice
+                repeated_manual.append(', '.join([scoring_file, str(linecounter), filename]))
+                continue
+            matched_keys.add(key)
+            # [filename, transect, total_time_sec, night, i_buzz, buzz]
+            yield sonochiro_index[key] + [to_value(fields[1])]
+
+
+def join_jip_sonochiro(scoring_directory, **filters):
+    """Join the manual buzz scores in scoring_directory to the sonochiro entries on recording filename, instead
+    of using a combined_jip_sc file. Return a tuple of length 4 with an array like array_from_input, a list with
+    (scoring file, line, filename) of scores without a sonochiro entry, a list like it of repeated scores of a
+    recording, of which only the first is joined, and a list with the filenames of sonochiro entries without a
+    score. The filters are passed on to load_sonochiro_file.
+    """
+    sonochiro_index = create_sonochiro_index(**filters)
+    unmatched_manual, repeated_manual, matched_keys = [], [], set()
+    jip_sc_array = list(iter_joined_rows(sonochiro_index, scoring_directory, unmatched_manual, repeated_manual,
+                                         matched_keys))
+    unmatched_sonochiro = [row[0] for key, row in sonochiro_index.items() if key not in matched_keys]
+    return jip_sc_array, unmatched_manual, repeated_manual, unmatched_sonochiro
 
 
 def find_min_max_per_transect(jip_sc_array):
@@ -112,8 +174,48 @@ def create_comparison_array(jip_sc_array, min_per_unit, buzz_index, filter_empty
         comparison_array.extend(array)
     if filter_empty_entries:
         comparison_array = [entry for entry in comparison_array if sum(entry[3:]) > 0]
-    column_names = ['transect', 'night', 'time_in_sec', 'buzz_count', 'ibuz_total', 'ibuz_count', 'ibuz_count_thresh']
-    return comparison_array, column_names
+    return comparison_array, comparison_column_names()
+
+
+def comparison_column_names():
+    """Return the header names of a comparison array"""
+    return ['transect', 'night', 'time_in_sec', 'buzz_count', 'ibuz_total', 'ibuz_count', 'ibuz_count_thresh']
+
+
+def stream_comparison_array(jip_sc_rows, min_per_unit, buzz_index, filter_empty_entries=True,
+                            max_in_memory=500000):
+    """Yield the rows of create_comparison_array in a single pass over jip_sc_rows, sorted on transect and time
+    instead of in order of appearance of the transects. A list is sorted in memory, other iterables (like
+    iter_array_from_input) are sorted externally holding at most max_in_memory rows in memory.
+    """
+    sec_per_unit = min_per_unit * 60
+    sun_data = load_sun_data()
+    entries = ((row[1], row[2], row[4], row[5]) for row in jip_sc_rows)  # transect, total_time, ibuz, jip buzz
+    if isinstance(jip_sc_rows, list):
+        entries = sorted(entries, key=itemgetter(0, 1))
+    else:
+        entries = external_sort(entries, key=itemgetter(0, 1), max_in_memory=max_in_memory)
+    current = None  # the entry of the time unit being counted
+    for transect, total_time, ibuz, buzz in entries:
+        unit_time = total_time - total_time % sec_per_unit
+        if current is not None and (current[0] != transect or current[2] != unit_time):
+            if not filter_empty_entries or sum(current[3:]) > 0:
+                yield current
+            if not filter_empty_entries and current[0] == transect:  # add the empty units in between
+                for curr_time in range(current[2] + sec_per_unit, unit_time, sec_per_unit):
+                    yield [transect, lookup_sun_data(sun_data, curr_time), curr_time, 0, 0, 0, 0]
+            current = None
+        if current is None:
+            current = [transect, lookup_sun_data(sun_data, unit_time), unit_time, 0, 0, 0, 0]
+        if buzz == 1:  # if Jip scored a buzz
+            current[3] += 1
+        current[4] += ibuz  # add all ibuzzes
+        if ibuz > 0:  # if there is a feeding buzz index higher than 0
+            current[5] += 1
+        if ibuz >= buzz_index:  # if feeding buzz index is higher than threshold
+            current[6] += 1  # count file with sufficient buzz index
+    if current is not None and (not filter_empty_entries or sum(current[3:]) > 0):
+        yield current
 
 
 # The script is here
@@ -121,22 +223,33 @@ if __name__ == "__main__":
     minutes_unit = 30  # set minute interval in which to compare
     ibuz_th = 2  # set ibuz threshold under which entries will be excluded
 
-    # Specify input (to load) and output (to write) file
+    # Specify input (to load) and output (to write) file, or join the scoring files directly to sonochiro output
     file_to_load = "combined_jip_sc.csv"
+    join_scoring_files = False
+    scoring_directory = "jip_scoring_files"
     file_to_write = "dataset_jip_sc_per_%d_min_with_ibuz_threshold_of_%d.csv" % (minutes_unit, ibuz_th)
+    database = None  # set to a file name like 'lon_datasets.sqlite' to also store the dataset in an sqlite database
 
     # The script
     print("SONOCHIRO AND JIP COMPARISON DATA CREATION SCRIPT FOR LON BY HUGO LONING 2016\n")
-    print("Loading {}...\n".format(file_to_load))
     start_time1 = time.time()  # measure time to complete program
-    loaded_array = array_from_input(file_to_load)
-    print("Loaded in {:.3f} seconds\n".format(time.time() - start_time1))
+    if join_scoring_files:
+        print("Joining scoring files in {} to sonochiro output files...\n".format(scoring_directory))
+        loaded_array, unmatched_scores, repeated_scores, unmatched_sc = join_jip_sonochiro(scoring_directory)
+        print("Joined in {:.3f} seconds, {} scores had no sonochiro entry, {} scores repeated an earlier\n"
+              "score of the recording and were left out and {} sonochiro entries had no score, type\n"
+              "\'unmatched_scores\', \'repeated_scores\' or \'unmatched_sc\' for a list of them.\n".format(
+                  time.time() - start_time1, len(unmatched_scores), len(repeated_scores), len(unmatched_sc)))
+    else:  # stream the file, it is read while the comparison array is created
+        loaded_array = iter_array_from_input(file_to_load)
     print("Creating comparison array...\n")
     start_time2 = time.time()
-    fb_arr, names = create_comparison_array(loaded_array, minutes_unit, ibuz_th)
+    fb_arr, names = list(stream_comparison_array(loaded_array, minutes_unit, ibuz_th)), comparison_column_names()
     print("Created in {:.3f} seconds.\n".format(time.time()-start_time2))
     print("Writing feeding buzz array to {}...\n".format(file_to_write))
     start_time3 = time.time()
     write_array(fb_arr, names, file_to_write)
+    if database is not None:
+        write_sqlite(fb_arr, names, database, "jip_sc_per_%d_min_with_ibuz_threshold_of_%d" % (minutes_unit, ibuz_th))
     print("Written in {:.3f} seconds, total run time {:.1f} seconds.".format(time.time() - start_time3,
                                                                              time.time() - start_time1))
@@ -2,9 +2,22 @@
 
 import time
 from collections import defaultdict
+from operator import itemgetter
 
+from helper.external_sort import external_sort
 from helper.write_data import write_array
-from sonochiro_dataset_creation import load_sonochiro_file
+from sonochiro_dataset_creation import iter_sonochiro_entries
+
+
+def sorted_activity(sonochiro_rows, max_in_memory=500000):
+    """Yield a tuple (transect, total_time_sec, row) for every row of sonochiro_rows, sorted on transect and time.
+    A list is sorted in memory, other iterables (like iter_sonochiro_entries) are streamed through an external
+    sort holding at most max_in_memory rows in memory, the rest is sorted in temporary files.
+    """
+    entries = ((row[1], row[5], row) for row in sonochiro_rows)
+    if isinstance(sonochiro_rows, list):  # already in memory, spilling to disk would only cost time
+        return iter(sorted(entries, key=itemgetter(0, 1)))
+    return external_sort(entries, key=itemgetter(0, 1), max_in_memory=max_in_memory)
 
 
 def transect_entries(sonochiro_array):
@@ -60,20 +73,48 @@ def create_bout_analysis_dataset(sonochiro_array, gap_sec, only_pp=True, buzz_in
         if row[19] >= buzz_index:
             row[-1] = 1
         edited_array[i] = row
-    column_names = ['filename', 'transect', 'site', 'colour', 'night', 'total_time_sec', 'detector', 'comp_fl',
-                    'final_id', 'contact', 'group', 'group_index', 'species', 'species_index',
-                    'nb_calls', 'med_freq', 'med_int', 'i_qual', 'i_sc', 'i_buzz', 'gap_dt', 'buzz']
-    return edited_array, column_names
+    return edited_array, bout_column_names()
+
+
+def bout_column_names():
+    """Return the header names of a bout analysis dataset"""
+    return ['filename', 'transect', 'site', 'colour', 'night', 'total_time_sec', 'detector', 'comp_fl',
+            'final_id', 'contact', 'group', 'group_index', 'species', 'species_index',
+            'nb_calls', 'med_freq', 'med_int', 'i_qual', 'i_sc', 'i_buzz', 'gap_dt', 'buzz']
+
+
+def stream_bout_analysis(sonochiro_rows, gap_sec, only_pp=True, buzz_index=2, max_in_memory=500000):
+    """Yield the rows of create_bout_analysis_dataset from sonochiro_rows, sorted on transect and time instead
+    of in input order. If sonochiro_rows is a stream (like iter_sonochiro_entries) instead of a list, it is sorted
+    externally with at most max_in_memory rows in memory, so the gaps and the time since the last gap are found
+    in a single pass over archives larger than memory.
+    """
+    if only_pp and isinstance(sonochiro_rows, list):  # filter out entries other than Pippistrellus pippistrellus
+        sonochiro_rows = [row for row in sonochiro_rows if row[8] == "PippiT"]
+    elif only_pp:  # keep streaming
+        sonochiro_rows = (row for row in sonochiro_rows if row[8] == "PippiT")
+    last_activity, last_gap_end = {}, {}
+    for transect, activity, row in sorted_activity(sonochiro_rows, max_in_memory):
+        # the first recording of a transect or the end time of a gap longer than gap_sec
+        if transect not in last_gap_end or activity - last_activity[transect] >= gap_sec:
+            last_gap_end[transect] = activity
+        last_activity[transect] = activity
+        yield row + [activity - last_gap_end[transect], 1 if row[19] >= buzz_index else 0]
 
 
 if __name__ == "__main__":
     gap = 30  # which amount of seconds is defined as a gap
+    rows_in_memory = 500000  # maximum number of rows to sort in memory, more are sorted in temporary files
     file_to_write = "dataset_bout_analysis_with_{}_second_gaps.csv".format(gap)
 
     start = time.time()
-    sc = load_sonochiro_file()[0]
-    print("loaded sc file in {:.3f} seconds".format(time.time()-start))
-    start2 = time.time()
-    bout_array, col_names = create_bout_analysis_dataset(sc, gap)
-    print("created bout array in {:.3f} seconds".format(time.time() - start2))
-    write_array(bout_array, col_names, file_to_write)
+    log = {}  # counts of the entries skipped, excluded and removed while streaming
+    sc = iter_sonochiro_entries(log, species="PippiT")  # only Pippistrellus pippistrellus entries are loaded
+    write_array(stream_bout_analysis(sc, gap, only_pp=False, max_in_memory=rows_in_memory), bout_column_names(),
+                file_to_write)
+    print("loaded sc files, created and written bout array in {:.3f} seconds".format(time.time() - start))
+    print("{} entries were unusable and skipped, {} entries were in nights that did not have all detectors\n"
+          "running and were excluded, {} entries were duplicates and removed, {} entries were not common\n"
+          "pippistrelle and filtered out, type \'log\' for the lists of entries (output file, line, filename)\n"
+          "skipped or removed.".format(len(log['skipped']), log['excluded'], len(log['duplicates']),
+                                       log['filtered']))
@@ -5,8 +5,8 @@ By Hugo Loning 2016
 import time
 from collections import defaultdict
 
-from helper.load_info import load_transects
-from helper.write_data import write_array
+from helper.reference_data import load_transects
+from helper.write_data import write_array, write_sqlite
 from sonochiro_dataset_creation import load_sonochiro_file
 
 
@@ -76,21 +76,20 @@ def create_feeding_buzz_array(sonochiro_array, buzz_index=2):
 if __name__ == "__main__":
     # Specify output file
     file_to_write = "dataset_sonochiro_feeding_buzz.csv"
+    database = None  # set to a file name like 'lon_datasets.sqlite' to also store the dataset in an sqlite database
 
     # The script
     print("SONOCHIRO FEEDING BUZZ DATA CREATION SCRIPT FOR LON BY HUGO LONING 2016\n")
-    print("Loading sonochiro output files...\n")
+    print("Loading common pippistrelle entries of sonochiro output files...\n")
     t1 = time.time()  # measure time to complete program
-    sc, cn, skipped, excluded = load_sonochiro_file()  # cn will not be used
+    # cn will not be used, filtering on species is done during loading
+    filtered, cn, skipped, excluded, duplicated, filtered_out = load_sonochiro_file(species="PippiT")
     print("Loaded in {:.3f} seconds, of {} total entries, {} entries were unusable\n"
           "and skipped, {} entries were in nights that did not have all detectors\n"
-          "running and were excluded.\n".format(time.time() - t1, len(sc) + len(skipped) + excluded,
-                                                len(skipped), excluded))
-    print("Filtering out all but common pippistrelle entries...\n")
-    t2 = time.time()
-    filtered = filter_sonochiro_array(sc)
-    print("Filtered in {:.3f} seconds, {} entries were filtered out.\n".format(time.time() - t2,
-                                                                               len(sc) - len(filtered)))
+          "running and were excluded, {} entries were duplicates and removed,\n"
+          "{} entries were not common pippistrelle and filtered out.\n".format(
+              time.time() - t1, len(filtered) + len(skipped) + excluded + len(duplicated) + filtered_out,
+              len(skipped), excluded, len(duplicated), filtered_out))
     print("Creating feeding buzz array...\n")
     t3 = time.time()
     fb_arr, names = create_feeding_buzz_array(filtered)
@@ -98,6 +97,8 @@ if __name__ == "__main__":
     print("Writing feeding buzz array to {}...\n".format(file_to_write))
     t4 = time.time()
     write_array(fb_arr, names, file_to_write)
+    if database is not None:
+        write_sqlite(fb_arr, names, database, "sonochiro_feeding_buzz")
     print("Written in {:.3f} seconds, total run time {:.1f} seconds, type \'skipped\' for \n"
           "a list of the entries (output file, line, filename) skipped during file loading.".format(time.time() - t4,
                                                                                                     time.time() - t1))
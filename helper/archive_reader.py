@@ -0,0 +1,95 @@
+"""Module for reading csv output files straight out of archives of past seasons. Besides plain .csv files,
+gzip (.csv.gz) and lzma (.csv.xz) compressed files and csv files inside zip files are read without extracting
+them to disk. Decompression happens in a reader thread which feeds lines to the parser through a bounded queue.
+"""
+
+import gzip
+import lzma
+import os
+import queue
+import threading
+import zipfile
+from glob import glob
+
+COMPRESSED_OPENERS = {'.csv.gz': gzip.open, '.csv.xz': lzma.open}
+
+
+def find_csv_sources(directory):
+    """Return a sorted list of tuples (name, path, member) of all csv files in directory, plain, compressed or
+    inside a zip file. member is the name of the csv file inside the zip file, None for other files. name is
+    the filename, for zip members prefixed with the name of the zip file.
+    """
+    sources = []
+    for path in sorted(glob(os.path.join(directory, '*'))):
+        filename = os.path.basename(path)
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    if member.lower().endswith('.csv'):
+                        sources.append((filename + '/' + os.path.basename(member), path, member))
+        elif filename.lower().endswith(('.csv',) + tuple(COMPRESSED_OPENERS)):
+            sources.append((filename, path, None))
+    return sources
+
+
+def is_plain_csv(path, member=None):
+    """Check whether csv source is a plain, uncompressed csv file (one that can be memory-mapped), return bool"""
+    return member is None and path.lower().endswith('.csv')
+
+
+def open_csv_source(path, member=None):
+    """Return a binary file object of a csv source as found by find_csv_sources, decompressing on the fly"""
+    if member is not None:
+        with zipfile.ZipFile(path) as archive:
+            return archive.open(member)  # the member stays readable after the zip file itself is closed
+    for extension, opener in COMPRESSED_OPENERS.items():
+        if path.lower().endswith(extension):
+            return opener(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_source_lines(path, member=None, queue_size=8, chunk_size=1 << 20):
+    """Yield every line (bytes without line ending) of a csv source as found by find_csv_sources. The source is
+    read and decompressed in chunks of chunk_size bytes in a reader thread, which puts the lines in a queue
+    holding at most queue_size chunks, so decompression overlaps with the parsing done by the caller.
+    """
+    lines_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():  # give up when the caller stopped reading
+            try:
+                lines_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            with open_csv_source(path, member) as input_file:
+                remainder = b''
+                for chunk in iter(lambda: input_file.read(chunk_size), b''):
+                    lines = (remainder + chunk).split(b'\n')
+                    remainder = lines.pop()  # the last line might continue in the next chunk
+                    if not put([line[:-1] if line.endswith(b'\r') else line for line in lines]):
+                        return
+                if remainder:  # last line without a newline at the end
+                    put([remainder[:-1] if remainder.endswith(b'\r') else remainder])
+        except Exception as error:  # hand errors over to the caller
+            put(error)
+        put(None)  # signal the end of the source
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            lines = lines_queue.get()
+            if lines is None:
+                return
+            if isinstance(lines, Exception):
+                raise lines
+            yield from lines
+    finally:
+        stop.set()
+        reader.join()
@@ -1,33 +1,45 @@
-"""Contains functions for combining csv output files of sonochiro and imagej for the Light on Nature project."""
-
-import os
+"""Contains functions for combining csv output files of sonochiro and imagej for the Light on Nature project.
+The output files can be plain csv files, compressed (.csv.gz, .csv.xz) or inside zip files.
+"""
 
 from collections import defaultdict
-from glob import glob
+
+from helper.archive_reader import find_csv_sources, is_plain_csv, iter_source_lines
+from helper.mmap_reader import iter_fields, split_fields
 
 
-def combine_sonochiro_files():
+def combine_sonochiro_files(directory="sonochiro_output_files"):
     """Return all combined sonochiro output files in directory with this name in a dict of lists with filename as key"""
     csv_files = defaultdict(list)
-    for csv_file in glob(r"sonochiro_output_files\*.csv"):
-        with open(csv_file, 'r') as sc_file:
-            filename = os.path.split(csv_file)[1]
-            for line in sc_file:
-                csv_files[filename].append(line)
+    for filename, path, member in find_csv_sources(directory):
+        for line in iter_source_lines(path, member):
+            csv_files[filename].append(line.decode() + "\n")
     return dict(csv_files)
 
 
-def combine_imagej_files():
+def iter_sonochiro_fields(columns, int_columns=(), directory="sonochiro_output_files"):
+    """Yield a tuple (filename, line number, fields) for every line of all sonochiro output files in directory
+    with this name. Only the fields at the positions in columns are split out of the memory-mapped files,
+    see helper.mmap_reader.iter_fields. Compressed files and zip members are streamed instead of mapped.
+    """
+    for filename, path, member in find_csv_sources(directory):
+        if is_plain_csv(path, member):
+            for linecounter, fields in iter_fields(path, columns, int_columns):
+                yield filename, linecounter, fields
+        else:
+            for linecounter, line in enumerate(iter_source_lines(path, member)):
+                yield filename, linecounter, split_fields(line, columns, int_columns)
+
+
+def combine_imagej_files(directory="imagej_output_files"):
     """Return all combined csv imagej output files in directory with that name in a list.
     Rows consist of original filename + the value in the area column from imagej.
     """
     csv_files = []
-    for csv_file in glob(r"imagej_output_files\*.csv"):
-        with open(csv_file, 'r') as ij_file:
-            filename = os.path.split(csv_file)[1]
-            for line in ij_file:
-                if line == ' ,Area,Mean,Min,Max\n':  # if it's a header
-                    continue
-                area = line.split(",")[1]  # take the area entry
-                csv_files.append([filename, area])
+    for filename, path, member in find_csv_sources(directory):
+        for line in iter_source_lines(path, member):
+            if line == b' ,Area,Mean,Min,Max':  # if it's a header
+                continue
+            area = line.split(b",")[1].decode()  # take the area entry
+            csv_files.append([filename, area])
     return csv_files
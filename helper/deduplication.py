@@ -0,0 +1,42 @@
+"""Module for recognising recordings that occur more than once in (re-exported or overlapping) sonochiro output
+files. Recording filenames are reduced to 64 bit hashes, which can be saved to and loaded from a compact binary
+index file so recordings handled in an earlier run are recognised in the next one.
+"""
+
+import hashlib
+import os
+import tempfile
+from array import array
+
+DUPLICATE_POLICIES = ('first', 'last', 'report')  # keep first copy, keep last copy, keep first and report conflicts
+
+
+def filename_hash(filename):
+    """Return a 64 bit hash as int of a recording filename"""
+    return int.from_bytes(hashlib.blake2b(filename.encode(), digest_size=8).digest(), 'little')
+
+
+def load_hash_index(index_file):
+    """Return a set with all hashes saved in index_file, an empty set if the file does not exist (yet)"""
+    hashes = array('Q')
+    if os.path.exists(index_file):
+        with open(index_file, 'rb') as input_file:
+            hashes.frombytes(input_file.read())
+    return set(hashes)
+
+
+def save_hash_index(hashes, index_file):
+    """Save iterable hashes sorted as unsigned 64 bit integers to index_file. The index is written to a temporary
+    file first and then moved over index_file, so an interrupted run leaves the previous index intact.
+    """
+    handle, temporary_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_file)))
+    try:
+        with os.fdopen(handle, 'wb') as output_file:
+            array('Q', sorted(hashes)).tofile(output_file)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temporary_file, 0o666 & ~umask)  # mkstemp makes it private, others should read it too
+        os.replace(temporary_file, index_file)
+    except BaseException:
+        os.remove(temporary_file)
+        raise
@@ -0,0 +1,71 @@
+"""Module for sorting streams of records that do not fit in memory. Records are collected in chunks, each chunk
+is sorted and spilled to a temporary file as a run, and the runs are merged back into one sorted stream.
+"""
+
+import heapq
+import pickle
+import tempfile
+
+
+def _spill_run(chunk, key, tmp_dir):
+    """Sort chunk and write it to a new temporary file, return the file rewound to its start"""
+    chunk.sort(key=key)
+    run_file = tempfile.TemporaryFile(dir=tmp_dir)
+    for record in chunk:  # pickle every record on its own, so no record refers to objects of another one
+        pickle.dump(record, run_file, pickle.HIGHEST_PROTOCOL)
+    run_file.seek(0)
+    return run_file
+
+
+def _read_run(run_file):
+    """Yield all records of a run file written by _spill_run"""
+    while True:
+        try:
+            yield pickle.load(run_file)
+        except EOFError:
+            return
+
+
+def external_sort(records, key=None, max_in_memory=500000, tmp_dir=None):
+    """Yield all records of iterable records sorted on key, holding at most max_in_memory records in memory.
+    If there are more records, sorted runs are spilled to temporary files (in tmp_dir, or the default temporary
+    directory if None) and merged as a stream. The sort is stable, like sorted.
+    """
+    run_files = []
+    try:
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= max_in_memory:
+                run_files.append(_spill_run(chunk, key, tmp_dir))
+                chunk = []
+        if not run_files:  # everything fits in memory, no need for temporary files
+            chunk.sort(key=key)
+            yield from chunk
+            return
+        if chunk:
+            run_files.append(_spill_run(chunk, key, tmp_dir))
+        del chunk
+        yield from heapq.merge(*[_read_run(run_file) for run_file in run_files], key=key)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def check_external_sort():
+    """Sort records sharing objects between them (like the cached short strings of sonochiro rows) with and
+    without spilling runs to disk and raise an AssertionError if the results differ.
+    """
+    records = []
+    for index in range(20, 0, -1):
+        value = 'v{}'.format(index)  # the same object twice in a record, pickled as a reference the second time
+        records.append((index % 3, index, [value, value]))
+    expected = sorted(records, key=lambda record: record[0])
+    for max_in_memory in (1, 3, 7, 100):
+        result = list(external_sort(iter(records), key=lambda record: record[0], max_in_memory=max_in_memory))
+        assert result == expected, (max_in_memory, result)
+
+
+if __name__ == "__main__":
+    check_external_sort()
+    print("External sort gave the same result with and without spilling to disk.")
@@ -0,0 +1,114 @@
+"""Module for measuring bat box photos without the imagej macro. For each photo the area of the oval
+measurement region and the area of every dark particle (poo) inside it is measured in pixels, giving the same
+measurements as the _oval.csv and _particles.csv files of the macro.
+"""
+
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+import numpy as np
+from PIL import Image
+from scipy import ndimage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff')
+
+
+def is_bat_box_image(filename):
+    """Check whether filename is a photo following the trNN_kNN_YYYYMMDD_..._IMG_NNNN naming scheme, return bool"""
+    match = re.search(r'tr\d+_k\d+_\d{8}_\d+_IMG_\d+\.\w+$', filename)
+    return match is not None and os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def load_grey_image(path):
+    """Return a two-dimensional uint8 array with the grey values of the image at path"""
+    with Image.open(path) as image:
+        return np.asarray(image.convert('L'))
+
+
+def oval_mask(shape):
+    """Return a boolean array of given shape which is True inside the oval fitted to the image borders,
+    like makeOval(0, 0, width, height) in imagej.
+    """
+    height, width = shape
+    y = (np.arange(height) + 0.5 - height / 2) / (height / 2)
+    x = (np.arange(width) + 0.5 - width / 2) / (width / 2)
+    return y[:, np.newaxis] ** 2 + x[np.newaxis, :] ** 2 <= 1
+
+
+def isodata_threshold(values):
+    """Return the IsoData threshold (imagej 'Default' method) as int of a one-dimensional array of grey values"""
+    histogram = np.bincount(values, minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    threshold = int(values.mean())
+    while True:
+        below, above = histogram[:threshold + 1], histogram[threshold + 1:]
+        if below.sum() == 0 or above.sum() == 0:
+            return threshold
+        mean_below = (below * levels[:threshold + 1]).sum() / below.sum()
+        mean_above = (above * levels[threshold + 1:]).sum() / above.sum()
+        new_threshold = int((mean_below + mean_above) / 2)
+        if new_threshold == threshold:
+            return threshold
+        threshold = new_threshold
+
+
+def particle_areas(mask):
+    """Return a list with the area in pixels of each 8-connected particle in a boolean two-dimensional mask,
+    ordered by the position of the top left pixel of each particle.
+    """
+    labels, count = ndimage.label(mask, structure=np.ones((3, 3), dtype=bool))  # labels are in raster order
+    return np.bincount(labels.ravel(), minlength=count + 1)[1:].tolist()
+
+
+def analyse_image(path, threshold=None, min_size=0):
+    """Return a tuple (filename, oval area, list of particle areas) for the photo at path. Particles are the pixels
+    inside the oval with a grey value up to threshold (the IsoData threshold of the oval if None), particles
+    smaller than min_size pixels are left out like the size option of imagej's Analyze Particles.
+    """
+    grey = load_grey_image(path)
+    inside = oval_mask(grey.shape)
+    if threshold is None:
+        threshold = isodata_threshold(grey[inside])
+    particles = (grey <= threshold) & inside
+    areas = [area for area in particle_areas(particles) if area >= min_size]
+    return os.path.split(path)[1], int(inside.sum()), areas
+
+
+def analyse_images(directory, threshold=None, min_size=0, workers=None):
+    """Return a list of analyse_image results of all bat box photos in directory, the photos are divided over a
+    pool of worker processes (as many as there are cpu's if workers is None).
+    """
+    paths = sorted(path for path in glob(os.path.join(directory, '*')) if is_bat_box_image(os.path.split(path)[1]))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(analyse_image, paths, [threshold] * len(paths), [min_size] * len(paths),
+                                 chunksize=4))
+
+
+def check_image_analysis():
+    """Measure a synthetic photo with known oval and particle areas and raise an AssertionError if analyse_image
+    gets them wrong. The photo has a dark rectangle, two squares touching at a corner (one 8-connected particle),
+    a single pixel and a dark corner outside the oval, which should not be counted.
+    """
+    height, width = 60, 80
+    grey = np.full((height, width), 200, dtype=np.uint8)
+    grey[20:30, 20:40] = 10  # rectangle of 200 pixels
+    grey[35:40, 45:50] = 10  # two squares of 25 pixels touching diagonally
+    grey[40:45, 50:55] = 10
+    grey[25, 60] = 10  # single pixel
+    grey[:3, :3] = 10  # corner outside the oval
+    oval_area = sum(((x + 0.5 - width / 2) / (width / 2)) ** 2 + ((y + 0.5 - height / 2) / (height / 2)) ** 2 <= 1
+                    for y in range(height) for x in range(width))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'tr1_k1_20160101_1_IMG_0001.png')
+        Image.fromarray(grey).save(path)
+        result = analyse_image(path, threshold=100)
+        assert result == ('tr1_k1_20160101_1_IMG_0001.png', oval_area, [200, 1, 50]), result
+        assert analyse_image(path, threshold=100, min_size=2)[2] == [200, 50]
+
+
+if __name__ == "__main__":
+    check_image_analysis()
+    print("Image analysis measured the synthetic photo correctly.")
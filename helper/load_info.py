@@ -2,16 +2,24 @@
 the other modules.
 """
 
+import os
 import re
+from bisect import bisect_right
 from collections import defaultdict
 
 from helper.time_conversion import convert_to_sec
 
+HELPER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TRANSECTS_FILE = os.path.join(HELPER_DIRECTORY, "transects.csv")
+SUN_DATA_FILE = os.path.join(HELPER_DIRECTORY, "SunData.csv")
+ALLOWED_NIGHTS_FILE = os.path.join(HELPER_DIRECTORY, "2012-2016_allowednights.csv")
+LIGHTS_OFF_FILE = os.path.join(HELPER_DIRECTORY, "loglightsoff.csv")
+
 
 def load_transects():
     """Return a dictionary (transects:[site,colour]) of the transects.csv file"""
     transects = defaultdict(list)
-    with open(r"helper\transects.csv") as input_file:
+    with open(TRANSECTS_FILE) as input_file:
         for line in input_file:
             transect, site, name, colour = [int(elem) if elem.isdigit() else elem for elem in line.split(',')[:4]]
             transects[transect].extend([site, colour])
@@ -21,7 +29,7 @@ def load_transects():
 def load_sun_data():
     """Return a list containing converted time of noon of the SunData.csv file"""
     sun_data = []
-    with open(r"helper\SunData.csv") as input_file:
+    with open(SUN_DATA_FILE) as input_file:
         for line in input_file:
             match = re.search(r'(\d+)/(\d+)/(\d+) (\d+):(\d+):(\d+),\d+/\d+/\d+ (\d+):(\d+):(\d+)\n', line)
             month, day, year, dawn_h, dawn_m, dawn_s, dusk_h, dusk_m, dusk_s = [int(elem) for elem in match.groups()]
@@ -38,16 +46,16 @@ def load_sun_data():
 
 def lookup_sun_data(sun_data_array, converted_entry):
     """Lookup which night since 1st January 2012 belongs to ymdhms converted to sec entered, return int.
-    First night in sun_data_array is 31th Dec 2011."""
-    for night, sun_data_entry in enumerate(sun_data_array):
-        if converted_entry < sun_data_entry:
-            return night
+    First night in sun_data_array is 31th Dec 2011, the array is sorted so the night is found by bisection."""
+    night = bisect_right(sun_data_array, converted_entry)  # first night with a noon later than converted_entry
+    if night < len(sun_data_array):
+        return night
 
 
 def load_allowed_nights():
     """Return a dictionary (site:allowed nights) as values of the 2012-2016allowednights.csv file"""
     allowed = defaultdict(list)  # create a dictionary with an empty list for every key
-    with open(r"helper\2012-2016_allowednights.csv") as input_file:
+    with open(ALLOWED_NIGHTS_FILE) as input_file:
         for line in input_file:
             site, night = [int(elem) for elem in line.split(",")[:2]]
             allowed[site].append(night)
@@ -58,7 +66,7 @@ def load_lights_off(sun_data_array):
     """Return a dictionary (site:nights with lights off) of the loglightsoff.csv file"""
     site_codes = {'lbh': [1], 'vst': [2], 'rko': [3], 'ask': [4, 5], 'kla': [6, 7], 'hkv': [8]}
     light_off = defaultdict(list)  # create dictionary with for each entry an empty list
-    with open(r"helper\loglightsoff.csv") as input_file:
+    with open(LIGHTS_OFF_FILE) as input_file:
         for line in input_file:
             date, site_code, lights, remarks = line.strip().split(",")
             if lights == 'off':  # only execute code if the lights were off
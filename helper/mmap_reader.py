@@ -0,0 +1,104 @@
+"""Module for reading large csv files (sonochiro output, combined jip and sonochiro files) without decoding
+every line. The file is memory-mapped and line and field boundaries are found on the raw bytes, only the
+requested fields are handed out as memoryview slices of the mapping or as parsed integers.
+"""
+
+import mmap
+import os
+
+
+def to_str(field, encoding='utf-8'):
+    """Decode a memoryview field to str"""
+    return str(field, encoding)
+
+
+def to_value(field):
+    """Return the field as int if it consists of digits only, else decode it to str"""
+    text = str(field, 'utf-8')
+    return int(text) if text.isdigit() else text
+
+
+def _open_mapped(path):
+    """Return a read only mmap of the file at path, or None if the file is empty (those can not be mapped)"""
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as input_file:
+        return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _line_bounds(mapped):
+    """Yield a tuple (line number, start, end) for every line in mapped, end excluding the line ending"""
+    start, size, linecounter = 0, len(mapped), 0
+    while start < size:
+        end = mapped.find(b'\n', start)
+        if end == -1:  # last line without a newline at the end
+            end = size
+        next_start = end + 1
+        if end > start and mapped[end - 1] == 13:  # strip the \r of windows line endings
+            end -= 1
+        yield linecounter, start, end
+        start = next_start
+        linecounter += 1
+
+
+def _close_mapped(mapped, view):
+    """Release view and close mapped, leave the closing to the garbage collector if a caller kept a slice"""
+    view.release()
+    try:
+        mapped.close()
+    except BufferError:  # exported slices still exist, the mapping is closed when the last one is collected
+        pass
+
+
+def _split(buffer, view, start, end, columns, int_columns, delimiter):
+    """Return the fields of the line between start and end of buffer (with view a memoryview of buffer),
+    see iter_fields.
+    """
+    last_column = None if columns is None else max(columns)
+    bounds = []  # (start, end) of every field up to the last requested column
+    field_start = start
+    while last_column is None or len(bounds) <= last_column:
+        field_end = buffer.find(delimiter, field_start, end)
+        if field_end == -1:  # last field of the line
+            bounds.append((field_start, end))
+            break
+        bounds.append((field_start, field_end))
+        field_start = field_end + len(delimiter)
+    fields = []
+    for column in (range(len(bounds)) if columns is None else columns):
+        if column < len(bounds):
+            field = view[bounds[column][0]:bounds[column][1]]
+        else:
+            field = view[end:end]
+        if column in int_columns:
+            try:
+                field = int(field)
+            except ValueError:  # headers stay a memoryview, callers should raise for malformed data lines
+                pass
+        fields.append(field)
+    return fields
+
+
+def split_fields(line, columns=None, int_columns=(), delimiter=b','):
+    """Return the fields of line (bytes without line ending) like iter_fields does for lines of a mapped file,
+    for lines that can not be memory-mapped, like those of compressed files.
+    """
+    return _split(line, memoryview(line), 0, len(line), columns, int_columns, delimiter)
+
+
+def iter_fields(path, columns=None, int_columns=(), delimiter=b','):
+    """Yield a tuple (line number, list of fields) for every line of the file at path. Only the fields at the
+    positions in columns are returned (all fields if None) and splitting stops after the last requested column.
+    Fields in int_columns are parsed to int when possible, all other fields (and fields that are not a number,
+    like headers) are memoryviews into the mapped file, so callers should check unparsed int_columns fields of
+    data lines. Missing fields are returned as empty memoryviews.
+    """
+    mapped = _open_mapped(path)
+    if mapped is None:
+        return
+    view = memoryview(mapped)
+    try:
+        for linecounter, start, end in _line_bounds(mapped):
+            yield linecounter, _split(mapped, view, start, end, columns, int_columns, delimiter)
+    finally:
+        _close_mapped(mapped, view)
@@ -0,0 +1,108 @@
+"""Module for fast access to the supplementary data of helper.load_info. The four reference tables (transects,
+sun data, allowed nights and lights off) are parsed once, validated and stored together in a pickled snapshot
+next to the source files. The snapshot is rebuilt only when one of the source files changed and is loaded on the
+first call of one of the load functions below, which return the same data as their helper.load_info namesakes.
+The returned objects are shared between calls, so don't modify them.
+"""
+
+import os
+import pickle
+import tempfile
+
+from helper import load_info
+
+SNAPSHOT_FILE = os.path.join(load_info.HELPER_DIRECTORY, "reference_data.pickle")
+SNAPSHOT_VERSION = 1
+SOURCE_FILES = [load_info.TRANSECTS_FILE, load_info.SUN_DATA_FILE, load_info.ALLOWED_NIGHTS_FILE,
+                load_info.LIGHTS_OFF_FILE]
+
+_reference_data = None  # the loaded snapshot, filled on first use
+
+
+def source_signature():
+    """Return a list with (filename, size, modification time) of all source files of the snapshot"""
+    signature = []
+    for source_file in SOURCE_FILES:
+        status = os.stat(source_file)
+        signature.append((os.path.basename(source_file), status.st_size, status.st_mtime_ns))
+    return signature
+
+
+def build_reference_data():
+    """Parse all source files with helper.load_info and return the tables in a dictionary"""
+    sun_data = load_info.load_sun_data()
+    return {'transects': load_info.load_transects(), 'sun_data': sun_data,
+            'allowed_nights': load_info.load_allowed_nights(), 'lights_off': load_info.load_lights_off(sun_data)}
+
+
+def validate_reference_data(reference_data):
+    """Check the tables of reference_data, raise a ValueError describing the first problem found"""
+    sun_data = reference_data['sun_data']
+    if not sun_data or any(earlier >= later for earlier, later in zip(sun_data, sun_data[1:])):
+        raise ValueError("sun data should contain increasing noon times, check {}".format(load_info.SUN_DATA_FILE))
+    for transect, info in reference_data['transects'].items():
+        if len(info) != 2:
+            raise ValueError("transect {} should have one site and colour, check {}".format(
+                transect, load_info.TRANSECTS_FILE))
+    for site, nights in reference_data['lights_off'].items():
+        if None in nights:
+            raise ValueError("a lights off date of site {} is outside of the sun data, check {}".format(
+                site, load_info.LIGHTS_OFF_FILE))
+
+
+def load_reference_data():
+    """Return the dictionary with all reference tables, from the snapshot if it is up to date, otherwise
+    parse the source files and save a new snapshot. The result is kept for later calls.
+    """
+    global _reference_data
+    if _reference_data is not None:
+        return _reference_data
+    signature = source_signature()
+    try:
+        with open(SNAPSHOT_FILE, 'rb') as snapshot:
+            version, snapshot_signature, reference_data = pickle.load(snapshot)
+        if version != SNAPSHOT_VERSION or snapshot_signature != signature:
+            reference_data = None
+        else:
+            validate_reference_data(reference_data)
+    except Exception:  # no snapshot yet, or a damaged or outdated one which is simply rebuilt
+        reference_data = None
+    if reference_data is None:
+        reference_data = build_reference_data()
+        validate_reference_data(reference_data)
+        try:  # write to a unique temporary file first, so other processes never read a half written snapshot
+            handle, temporary_file = tempfile.mkstemp(dir=load_info.HELPER_DIRECTORY)
+            try:
+                with os.fdopen(handle, 'wb') as snapshot:
+                    pickle.dump((SNAPSHOT_VERSION, signature, reference_data), snapshot, pickle.HIGHEST_PROTOCOL)
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(temporary_file, 0o666 & ~umask)  # mkstemp makes it private, others should read it too
+                os.replace(temporary_file, SNAPSHOT_FILE)
+            except BaseException:
+                os.remove(temporary_file)
+                raise
+        except OSError:  # not being able to save the snapshot only costs time on the next run
+            pass
+    _reference_data = reference_data
+    return reference_data
+
+
+def load_transects():
+    """Return a dictionary (transects:[site,colour]) of the transects.csv file"""
+    return load_reference_data()['transects']
+
+
+def load_sun_data():
+    """Return a list containing converted time of noon of the SunData.csv file"""
+    return load_reference_data()['sun_data']
+
+
+def load_allowed_nights():
+    """Return a dictionary (site:allowed nights) as values of the 2012-2016allowednights.csv file"""
+    return load_reference_data()['allowed_nights']
+
+
+def load_lights_off():
+    """Return a dictionary (site:nights with lights off) of the loglightsoff.csv file"""
+    return load_reference_data()['lights_off']
@@ -1,4 +1,13 @@
-"""Module for writing csv files with specified header names"""
+"""Module for writing csv files with specified header names, and optionally storing the same datasets in an
+sqlite database.
+"""
+
+import hashlib
+import os
+import sqlite3
+from collections import defaultdict
+
+INDEXED_COLUMNS = ('transect', 'site', 'night', 'total_time_sec', 'time_in_sec')
 
 
 def write_array(array, header_names, output_file):
@@ -7,3 +16,93 @@ def write_array(array, header_names, output_file):
         output.write(",".join(header_names) + "\n")  # write header
         for row in array:
             output.write(",".join([str(element) for element in row]) + "\n")  # write rows
+
+
+def append_array(array, header_names, output_file):
+    """Append a two-dimensional array to a specified csv file, with header made from header_names if the file
+    is new or empty
+    """
+    new_file = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+    with open(output_file, "a") as output:
+        if new_file:
+            output.write(",".join(header_names) + "\n")  # write header
+        for row in array:
+            output.write(",".join([str(element) for element in row]) + "\n")  # write rows
+
+
+def sqlite_column_type(value, column_type='INTEGER'):
+    """Return the sqlite column type (INTEGER, REAL or TEXT) as str which fits value and the values that
+    column_type was inferred from
+    """
+    if column_type == 'TEXT' or type(value) is int:
+        return column_type
+    if type(value) is float:
+        return 'REAL'
+    return 'TEXT'
+
+
+def write_sqlite(array, header_names, database, table, partition_column='transect', batch_size=10000):
+    """Store a two-dimensional array with columns header_names in table of the sqlite database file. Columns
+    get a type fitting their values and the transect, site, night and time columns are indexed. The rows are
+    divided into partitions on partition_column (one partition if the column is not present), only partitions
+    which changed since the previous run are replaced, in batches of batch_size rows. Return the number of
+    partitions written as int.
+    """
+    header_names = list(header_names)
+    if partition_column in header_names:
+        partition_index = header_names.index(partition_column)
+        partition_filter = ' WHERE "{}" = ?'.format(partition_column)
+    else:  # the whole table is one partition
+        partition_index, partition_filter = None, ''
+    # infer the column types, divide the rows into partitions and hash each partition in a single pass
+    column_types = ['INTEGER'] * len(header_names)
+    partitions = defaultdict(list)
+    digests = defaultdict(hashlib.sha1)
+    for row in array:
+        for index, value in enumerate(row):
+            column_types[index] = sqlite_column_type(value, column_types[index])
+        partition = 'all' if partition_index is None else row[partition_index]
+        partitions[partition].append(row)
+        digests[partition].update(repr(row).encode() + b'\n')
+    columns = list(zip(header_names, column_types))
+
+    connection = sqlite3.connect(database)
+    try:
+        with connection:  # set up the table, recreate it if the column names or types changed
+            connection.execute('CREATE TABLE IF NOT EXISTS dataset_partitions '
+                               '(name TEXT, part, digest TEXT, PRIMARY KEY (name, part))')
+            existing_columns = [(info[1], info[2])
+                                for info in connection.execute('PRAGMA table_info("{}")'.format(table))]
+            if existing_columns != columns:
+                connection.execute('DROP TABLE IF EXISTS "{}"'.format(table))
+                connection.execute('DELETE FROM dataset_partitions WHERE name = ?', (table,))
+                connection.execute('CREATE TABLE "{}" ({})'.format(table, ', '.join(
+                    '"{}" {}'.format(name, column_type) for name, column_type in columns)))
+            for name in INDEXED_COLUMNS:
+                if name in header_names:
+                    connection.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(table, name))
+            stored = dict(connection.execute('SELECT part, digest FROM dataset_partitions WHERE name = ?',
+                                             (table,)))
+
+        insert = 'INSERT INTO "{}" VALUES ({})'.format(table, ', '.join('?' * len(header_names)))
+        written = 0
+        for partition, rows in partitions.items():
+            digest = digests[partition].hexdigest()
+            if stored.pop(partition, None) == digest:  # partition did not change since last run
+                continue
+            with connection:  # replace the partition in a single transaction
+                connection.execute('DELETE FROM "{}"{}'.format(table, partition_filter),
+                                   (partition,) if partition_index is not None else ())
+                for start in range(0, len(rows), batch_size):
+                    connection.executemany(insert, rows[start:start + batch_size])
+                connection.execute('INSERT OR REPLACE INTO dataset_partitions VALUES (?, ?, ?)',
+                                   (table, partition, digest))
+            written += 1
+        with connection:  # remove partitions which are no longer in the dataset
+            for partition in stored:
+                connection.execute('DELETE FROM "{}"{}'.format(table, partition_filter),
+                                   (partition,) if partition_index is not None else ())
+                connection.execute('DELETE FROM dataset_partitions WHERE name = ? AND part = ?', (table, partition))
+    finally:
+        connection.close()
+    return written
@@ -5,10 +5,23 @@ Light on Nature project. By Hugo Loning, 2016
 import re
 import time
 
-from helper.combine_output_files import combine_sonochiro_files
-from helper.load_info import load_transects, load_sun_data, lookup_sun_data, load_allowed_nights, load_lights_off
+from helper.combine_output_files import iter_sonochiro_fields
+from helper.deduplication import DUPLICATE_POLICIES, filename_hash, load_hash_index, save_hash_index
+from helper.load_info import lookup_sun_data
+from helper.mmap_reader import to_str
+from helper.reference_data import load_allowed_nights, load_lights_off, load_sun_data, load_transects
 from helper.time_conversion import convert_to_sec
-from helper.write_data import write_array
+from helper.write_data import append_array, write_array, write_sqlite
+
+# names of the columns of the sonochiro dataset, the first eight are extracted from the filename
+SONOCHIRO_COLUMN_NAMES = ['filename', 'transect', 'site', 'colour', 'night', 'total_time_sec', 'detector', 'comp_fl',
+                          'final_id', 'contact', 'group', 'group_index', 'species', 'species_index',
+                          'nb_calls', 'med_freq', 'med_int', 'i_qual', 'i_sc', 'i_buzz']
+# column in a sonochiro output file of the classification parameters, from column 17 on they are parsed to int
+RAW_COLUMNS = {'final_id': 2, 'contact': 3, 'group': 4, 'group_index': 5, 'species': 6, 'species_index': 7,
+               'nb_calls': 17, 'med_freq': 18, 'med_int': 19, 'i_qual': 20, 'i_sc': 21, 'i_buzz': 22}
+FILENAME_COLUMN = 1
+FIRST_INT_COLUMN = 17
 
 
 def is_valid_filename(filename):
@@ -38,64 +51,178 @@ def extract_tr_d_cf(filename):
     return transect, detector, comp_fl
 
 
-def load_sonochiro_file():
-    """Load sonochiro output files to a complete dataset array with all important information available.
-    Return a tuple of length 4 with the array, header names as list, list with skipped entries and count
-    as int of files excluded because they were not recorded during an allowed night or the lights were off.
+def iter_sonochiro_entries(log, duplicates='first', index_file=None, species=None, nights=None, transects=None,
+                           columns=None):
+    """Return a generator yielding the entries of the sonochiro dataset one by one, so files larger than memory
+    can be streamed. The arguments are those of load_sonochiro_file, except index_file. That is for incremental
+    runs which append to an existing dataset: recordings saved in index_file by an earlier run are left out and
+    counted in log['earlier_runs'], and all recordings of this run are added to it once every file was read.
+    Entries skipped and duplicates removed are added as (output file, line, filename) to the lists log['skipped']
+    and log['duplicates'], entries excluded and filtered out are counted in log['excluded'] and log['filtered'].
+    With duplicates 'first' only a hash per recording is kept in memory, with 'report' the entries themselves are
+    kept to compare later copies and with 'last' all entries are held and only yielded after every file was read,
+    because the last copy decides the classification and so whether the entry passes the species filter.
     """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError("duplicates should be one of {}, not {!r}".format(', '.join(DUPLICATE_POLICIES), duplicates))
+    if isinstance(species, str):
+        species = [species]
+    species_filter = None if species is None else {name.encode() for name in species}
+    columns = SONOCHIRO_COLUMN_NAMES if columns is None else list(columns)
+    unknown = [name for name in columns if name not in SONOCHIRO_COLUMN_NAMES]
+    if unknown:
+        raise ValueError("unknown column name(s) {}, columns should be in {}".format(
+            ', '.join(map(repr, unknown)), ', '.join(SONOCHIRO_COLUMN_NAMES)))
+    log['skipped'], log['duplicates'], log['excluded'], log['filtered'], log['earlier_runs'] = [], [], 0, 0, 0
+    return _iter_sonochiro_entries(log, duplicates, index_file, species_filter, nights, transects, columns)
+
+
+def _iter_sonochiro_entries(log, duplicates, index_file, species_filter, nights, transects, columns):
+    """Generator doing the actual work of iter_sonochiro_entries, after its arguments were checked"""
+    classification_names = [name for name in columns if name in RAW_COLUMNS]
+    # read the filename, the requested classification parameters and final_id when filtering on it (as last field)
+    raw_columns = [FILENAME_COLUMN] + [RAW_COLUMNS[name] for name in classification_names]
+    if species_filter is not None:
+        raw_columns.append(RAW_COLUMNS['final_id'])
+    raw_int_columns = [column for column in raw_columns if column >= FIRST_INT_COLUMN]
+    int_positions = [position for position, column in enumerate(raw_columns) if column >= FIRST_INT_COLUMN]
+    classification_end = 1 + len(classification_names)
+    # position of each requested column in the filename info followed by the classification parameters
+    order = [(SONOCHIRO_COLUMN_NAMES[:8] + classification_names).index(name) for name in columns]
+    reorder = order != list(range(len(order)))
+    classification_positions = [columns.index(name) for name in classification_names]
+
     sun_data = load_sun_data()
-    lights_off = load_lights_off(sun_data)
+    lights_off = load_lights_off()
     tr_array = load_transects()
     allowed_nights = load_allowed_nights()
-    loaded_sonochiro = combine_sonochiro_files()
-    sonochiro_array = []
-    skip = []  # keep track of entries skipped, using linecounter
-    excluded_total = 0  # count files that will be excluded_total because they are not an allowed night
-    for csv_file in loaded_sonochiro:
-        for linecounter, line in enumerate(loaded_sonochiro[csv_file]):
-            line = line.strip().split(",")
-            filename = line[1]
-            if not is_valid_filename(filename):  # skip files with invalid filenames, this includes headers
-                if filename == 'File':
-                    filename = 'Header'
-                skip.append(', '.join([csv_file, str(linecounter), filename]))
-                continue
-            year, month, day, hour, minute, second = extract_time(filename)
-            total_time_sec = convert_to_sec(year, month, day, hour, minute, second)
-            night = lookup_sun_data(sun_data, total_time_sec)
-            transect, detector, comp_fl = extract_tr_d_cf(filename)
-            site, colour = tr_array[transect]
-            if night not in allowed_nights[site] or night in lights_off[site]:
-                excluded_total += 1
-                continue
-            entry = [filename, transect, site, colour, night, total_time_sec, detector, comp_fl]
-            entry.extend(line[2:8])  # add species classification parameters
-            entry.extend([int(elem) for elem in line[17:]])  # add sound classification parameters as int
-            sonochiro_array.append(entry)
-    name_of_column = ['filename', 'transect', 'site', 'colour', 'night', 'total_time_sec', 'detector', 'comp_fl',
-                      'final_id', 'contact', 'group', 'group_index', 'species', 'species_index',
-                      'nb_calls', 'med_freq', 'med_int', 'i_qual', 'i_sc', 'i_buzz']
-    return sonochiro_array, name_of_column, skip, excluded_total
+    skip, duplicate = log['skipped'], log['duplicates']
+    earlier_runs = load_hash_index(index_file) if index_file is not None else set()
+    seen = {}  # filename hash: the entry (True with duplicates 'first'), None if the entry was excluded or filtered
+    held = []  # with duplicates 'last' all entries (filename hash, entry) are held until every file was read
+    final_ids = {}  # with duplicates 'last' and a species filter the final_id of the last copy of each entry
+    filter_early = species_filter is not None and duplicates != 'last'
+    for csv_file, linecounter, fields in iter_sonochiro_fields(raw_columns, raw_int_columns):
+        filename = to_str(fields[0])
+        if not is_valid_filename(filename):  # skip files with invalid filenames, this includes headers
+            if filename == 'File':
+                filename = 'Header'
+            skip.append(', '.join([csv_file, str(linecounter), filename]))
+            continue
+        for position in int_positions:  # fields that could not be parsed are only expected in headers
+            if not isinstance(fields[position], int):
+                int(to_str(fields[position]))  # raises the ValueError of the malformed field
+        key = filename_hash(filename)
+        if key in earlier_runs:  # already in the dataset made by an earlier incremental run
+            log['earlier_runs'] += 1
+            continue
+        if key in seen:
+            kept = seen[key]
+            if kept is not None and duplicates != 'first':
+                classification = [elem if isinstance(elem, int) else to_str(elem)
+                                  for elem in fields[1:classification_end]]
+                if classification != [kept[position] for position in classification_positions]:
+                    if duplicates == 'last':  # the other information is extracted from the filename so is the same
+                        for position, value in zip(classification_positions, classification):
+                            kept[position] = value
+                    elif duplicates == 'report':
+                        filename += ', conflict'
+                if duplicates == 'last' and species_filter is not None:
+                    final_ids[key] = fields[-1].tobytes()
+            duplicate.append(', '.join([csv_file, str(linecounter), filename]))
+            continue
+        if filter_early and fields[-1].tobytes() not in species_filter:
+            log['filtered'] += 1
+            seen[key] = None
+            continue
+        transect, detector, comp_fl = extract_tr_d_cf(filename)
+        if transects is not None and transect not in transects:
+            log['filtered'] += 1
+            seen[key] = None
+            continue
+        year, month, day, hour, minute, second = extract_time(filename)
+        total_time_sec = convert_to_sec(year, month, day, hour, minute, second)
+        night = lookup_sun_data(sun_data, total_time_sec)
+        if nights is not None and night not in nights:
+            log['filtered'] += 1
+            seen[key] = None
+            continue
+        site, colour = tr_array[transect]
+        if night not in allowed_nights[site] or night in lights_off[site]:
+            log['excluded'] += 1
+            seen[key] = None
+            continue
+        entry = [filename, transect, site, colour, night, total_time_sec, detector, comp_fl]
+        # add classification parameters, sound classification parameters are already parsed as int
+        entry.extend([elem if isinstance(elem, int) else to_str(elem) for elem in fields[1:classification_end]])
+        if reorder:
+            entry = [entry[position] for position in order]
+        seen[key] = True if duplicates == 'first' else entry
+        if duplicates != 'last':
+            yield entry
+            continue
+        held.append((key, entry))
+        if species_filter is not None:
+            final_ids[key] = fields[-1].tobytes()
+    if index_file is not None:
+        save_hash_index(earlier_runs.union(seen), index_file)
+    for key, entry in held:  # only with duplicates 'last', filter on the species of the last copy
+        if species_filter is not None and final_ids[key] not in species_filter:
+            log['filtered'] += 1
+            continue
+        yield entry
+
+
+def load_sonochiro_file(duplicates='first', species=None, nights=None, transects=None, columns=None):
+    """Load sonochiro output files to a complete dataset array with all important information available.
+    Recordings occurring more than once are kept once: with duplicates 'first' the first copy is kept, with 'last'
+    the classification of the last copy is used and with 'report' the first copy is kept and copies with a
+    different classification are marked as conflict.
+    Only entries with a final_id in species (a str or collection of str, with 'last' the final_id of the last
+    copy), recorded in nights and on transects (collections of int) are kept, None keeps all. Filtering is done
+    as early as possible, so rejected entries are never converted, and only the fields of the names in columns
+    (all of SONOCHIRO_COLUMN_NAMES if None) are decoded and put in the array, in that order. Names not in
+    SONOCHIRO_COLUMN_NAMES raise a ValueError.
+    Return a tuple of length 6 with the array, header names as list, list with skipped entries, count as int
+    of files excluded because they were not recorded during an allowed night or the lights were off, list
+    with duplicate entries removed and count as int of entries filtered out on species, night or transect.
+    """
+    log = {}
+    sonochiro_array = list(iter_sonochiro_entries(log, duplicates, None, species, nights, transects, columns))
+    column_names = list(SONOCHIRO_COLUMN_NAMES if columns is None else columns)
+    return sonochiro_array, column_names, log['skipped'], log['excluded'], log['duplicates'], log['filtered']
 
 
 # The actual script is here
 if __name__ == "__main__":
-    # Specify output file
+    # Specify output file, and whether to only append recordings not handled by an earlier (incremental) run
     file_to_write = "dataset_sonochiro.csv"
+    incremental = False
+    index_file = "dataset_sonochiro.index"  # recordings handled by earlier incremental runs, delete it with the output
+    database = None  # set to a file name like 'lon_datasets.sqlite' to also store the dataset in an sqlite database
 
     # The script
     print("SONOCHIRO DATA CREATION SCRIPT FOR LIGHT ON NATURE BY HUGO LONING 2016\n")
     print("Loading sonochiro output files...\n")
     t1 = time.time()  # measure time to complete program
-    sc, column_names, skipped, excluded = load_sonochiro_file()
+    log = {}
+    sc = list(iter_sonochiro_entries(log, index_file=index_file if incremental else None))  # nothing is filtered
+    column_names = SONOCHIRO_COLUMN_NAMES
+    skipped, excluded, duplicated, earlier = log['skipped'], log['excluded'], log['duplicates'], log['earlier_runs']
     print("Loaded in {:.1f} seconds, of {} total entries, {} entries were unusable\n"
           "and skipped, {} entries were in nights with lights off or in nights that\n"
-          "did not have all detectors running and were excluded.\n".format(time.time() - t1,
-                                                                           len(sc) + len(skipped) + excluded,
-                                                                           len(skipped), excluded))
+          "did not have all detectors running and were excluded, {} entries were\n"
+          "duplicates of another entry and removed, {} entries were already added\n"
+          "by an earlier run.\n".format(time.time() - t1, len(sc) + len(skipped) + excluded + len(duplicated) + earlier,
+                                        len(skipped), excluded, len(duplicated), earlier))
     print("Writing {}...\n".format(file_to_write))
     t2 = time.time()
-    write_array(sc, column_names, file_to_write)
-    print("Written in {:.1f} seconds, total run time {:.1f} seconds, type \'skipped\' for \n"
-          "a list of the entries (output file, line, filename) skipped during file loading.".format(time.time() - t2,
-                                                                                                    time.time() - t1))
+    if incremental:
+        append_array(sc, column_names, file_to_write)
+    else:
+        write_array(sc, column_names, file_to_write)
+    if database is not None and not incremental:  # the database is replaced per transect, so needs all entries
+        write_sqlite(sc, column_names, database, "sonochiro")
+    print("Written in {:.1f} seconds, total run time {:.1f} seconds, type \'skipped\' or \'duplicated\'\n"
+          "for a list of the entries (output file, line, filename) skipped or removed during\n"
+          "file loading.".format(time.time() - t2, time.time() - t1))